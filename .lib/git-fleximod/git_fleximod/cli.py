@@ -28,6 +28,13 @@ def find_root_dir(filename=".gitmodules"):
         return None
     return Path(root)
 
+def positive_int(value):
+    """ argparse type for options that count something, like --jobs """
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be a positive integer, not {value}")
+    return number
+
 def get_parser():
     description = """
     %(prog)s manages checking out groups of gitsubmodules with additional support for Earth System Models
@@ -93,6 +100,15 @@ def get_parser():
         "optional submodules relative to the toplevel directory.",
     )
 
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=positive_int,
+        default=None,
+        help="Number of submodules to query, fetch and clone concurrently. "
+        "Default: the number of processors, at most 8.",
+    )
+
     parser.add_argument(
         "-v",
         "--verbose",
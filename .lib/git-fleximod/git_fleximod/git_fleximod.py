@@ -6,9 +6,10 @@ if sys.version_info < MIN_PYTHON:
     sys.exit("Python %s.%s or later is required." % MIN_PYTHON)
 
 import os
-import shutil
 import logging
+import functools
 import textwrap
+from concurrent.futures import ThreadPoolExecutor
 from git_fleximod import utils
 from git_fleximod import cli
 from git_fleximod.gitinterface import GitInterface
@@ -17,6 +18,8 @@ from git_fleximod.submodule import Submodule
 
 # logger variable is global
 logger = None
+# number of concurrent submodule queries, None for the default
+jobs = None
 
 
 def fxrequired_allowed_values():
@@ -69,112 +72,15 @@ def commandline_arguments(args=None):
         options.exclude,
         options.force,
         action,
+        options.jobs,
     )
 
 
-def submodule_sparse_checkout(root_dir, name, url, path, sparsefile, tag="master"):
-    """
-    This function performs a sparse checkout of a git submodule.  It does so by first creating the .git/info/sparse-checkout fileq
-    in the submodule and then checking out the desired tag.  If the submodule is already checked out, it will not be checked out again.
-    Creating the sparse-checkout file first prevents the entire submodule from being checked out and then removed.  This is important
-    because the submodule may have a large number of files and checking out the entire submodule and then removing it would be time
-    and disk space consuming.
-
-    Parameters:
-    root_dir (str): The root directory for the git operation.
-    name (str): The name of the submodule.
-    url (str): The URL of the submodule.
-    path (str): The path to the submodule.
-    sparsefile (str): The sparse file for the submodule.
-    tag (str, optional): The tag to checkout. Defaults to "master".
-
-    Returns:
-    None
-    """
-    logger.info("Called sparse_checkout for {}".format(name))
-    rgit = GitInterface(root_dir, logger)
-    superroot = git_toplevelroot(root_dir, logger)
-
-    if superroot:
-        gitroot = superroot.strip()
-    else:
-        gitroot = root_dir.strip()
-    assert os.path.isdir(os.path.join(gitroot, ".git"))
-    # first create the module directory
-    if not os.path.isdir(os.path.join(root_dir, path)):
-        os.makedirs(os.path.join(root_dir, path))
-
-    # initialize a new git repo and set the sparse checkout flag
-    sprep_repo = os.path.join(root_dir, path)
-    sprepo_git = GitInterface(sprep_repo, logger)
-    if os.path.exists(os.path.join(sprep_repo, ".git")):
-        try:
-            logger.info("Submodule {} found".format(name))
-            chk = sprepo_git.config_get_value("core", "sparseCheckout")
-            if chk == "true":
-                logger.info("Sparse submodule {} already checked out".format(name))
-                return
-        except NoOptionError:
-            logger.debug("Sparse submodule {} not present".format(name))
-        except Exception as e:
-            utils.fatal_error("Unexpected error {} occured.".format(e))
-
-    sprepo_git.config_set_value("core", "sparseCheckout", "true")
-
-    # set the repository remote
-
-    logger.info("Setting remote origin in {}/{}".format(root_dir, path))
-    _, remotelist = sprepo_git.git_operation("remote", "-v")
-    if url not in remotelist:
-        sprepo_git.git_operation("remote", "add", "origin", url)
-
-    topgit = os.path.join(gitroot, ".git")
-
-    if gitroot != root_dir and os.path.isfile(os.path.join(root_dir, ".git")):
-        with open(os.path.join(root_dir, ".git")) as f:
-            gitpath = os.path.relpath(
-                os.path.join(root_dir, f.read().split()[1]),
-                start=os.path.join(root_dir, path),
-            )
-        topgit = os.path.join(gitpath, "modules")
-    else:
-        topgit = os.path.relpath(
-            os.path.join(root_dir, ".git", "modules"),
-            start=os.path.join(root_dir, path),
-        )
-
-    with utils.pushd(sprep_repo):
-        if not os.path.isdir(topgit):
-            os.makedirs(topgit)
-    topgit += os.sep + name
-
-    if os.path.isdir(os.path.join(root_dir, path, ".git")):
-        with utils.pushd(sprep_repo):
-            if os.path.isdir(os.path.join(topgit,".git")):
-                shutil.rmtree(os.path.join(topgit,".git"))
-            shutil.move(".git", topgit)
-            with open(".git", "w") as f:
-                f.write("gitdir: " + os.path.relpath(topgit))
-            #    assert(os.path.isdir(os.path.relpath(topgit, start=sprep_repo)))
-            gitsparse = os.path.abspath(os.path.join(topgit, "info", "sparse-checkout"))
-        if os.path.isfile(gitsparse):
-            logger.warning(
-                "submodule {} is already initialized {}".format(name, topgit)
-            )
-            return
-
-        with utils.pushd(sprep_repo):
-            if os.path.isfile(sparsefile):
-                shutil.copy(sparsefile, gitsparse)
-                
-
-    # Finally checkout the repo
-    sprepo_git.git_operation("fetch", "origin", "--tags")
-    sprepo_git.git_operation("checkout", tag)
-
-    print(f"Successfully checked out {name:>20} at {tag}")
-    rgit.config_set_value(f'submodule "{name}"', "active", "true")
-    rgit.config_set_value(f'submodule "{name}"', "url", url)
+def max_workers():
+    """Number of threads used for concurrent submodule git operations"""
+    if jobs:
+        return jobs
+    return min(8, os.cpu_count() or 1)
 
 def init_submodule_from_gitmodules(gitmodules, name, root_dir, logger):
     path = gitmodules.get(name, "path")
@@ -193,66 +99,95 @@ def submodules_status(gitmodules, root_dir, toplevel=False, depth=0):
     localmods = 0
     needsupdate = 0
     wrapper = textwrap.TextWrapper(initial_indent=' '*(depth*10), width=120,subsequent_indent=' '*(depth*20))
-    for name in gitmodules.sections():
-        submod = init_submodule_from_gitmodules(gitmodules, name, root_dir, logger)
-            
-        result,n,l,t = submod.status()
-        if toplevel or not submod.toplevel():
-            print(wrapper.fill(result))
-            testfails += t
-            localmods += l
-            needsupdate += n
-        subdir = os.path.join(root_dir, submod.path)
-        if os.path.exists(os.path.join(subdir, ".gitmodules")):
-            gsubmod = GitModules(logger, confpath=subdir)
-            t,l,n = submodules_status(gsubmod, subdir, depth=depth+1)
-            if toplevel or not submod.toplevel():
+    submods = [init_submodule_from_gitmodules(gitmodules, name, root_dir, logger)
+               for name in gitmodules.sections()]
+    # each status call is dominated by git and network latency in its own
+    # directory, so query them concurrently and report in .gitmodules order;
+    # map yields each result as soon as it and those before it are done, so
+    # the report appears as it goes rather than after the slowest submodule
+    with ThreadPoolExecutor(max_workers=max_workers()) as executor:
+        for submod, (result,n,l,t) in zip(submods, executor.map(Submodule.status, submods)):
+            counted = toplevel or not submod.toplevel()
+            if counted:
+                print(wrapper.fill(result), flush=True)
                 testfails += t
                 localmods += l
                 needsupdate += n
-            
+            subdir = submod.repodir
+            # status has already found out whether the submodule is checked out,
+            # one that is not can't have a .gitmodules to recurse into
+            if submod.checked_out() and os.path.exists(os.path.join(subdir, ".gitmodules")):
+                gsubmod = GitModules(logger, confpath=subdir)
+                t,l,n = submodules_status(gsubmod, subdir, depth=depth+1)
+                if counted:
+                    testfails += t
+                    localmods += l
+                    needsupdate += n
+
     return testfails, localmods, needsupdate
 
+@functools.lru_cache(maxsize=None)
 def git_toplevelroot(root_dir, logger):
+    # fixed for a given root_dir, however often submodules_update asks
     rgit = GitInterface(root_dir, logger)
     _, superroot = rgit.git_operation("rev-parse", "--show-superproject-working-tree")
     return superroot
 
+def _prepare_update(submod):
+    submod.status()
+    submod.fetch_fxtag()
+
 def submodules_update(gitmodules, root_dir, requiredlist, force):
-    for name in gitmodules.sections():
-        submod = init_submodule_from_gitmodules(gitmodules, name, root_dir, logger)
-    
-        _, needsupdate, localmods, testfails = submod.status()
+    submods = [init_submodule_from_gitmodules(gitmodules, name, root_dir, logger)
+               for name in gitmodules.sections()]
+    allowedvalues = fxrequired_allowed_values()
+    superroot = git_toplevelroot(root_dir, logger)
+    # decide up front which submodules are updated, the rest need no git at all
+    selected = []
+    for submod in submods:
         if not submod.fxrequired:
             submod.fxrequired = "AlwaysRequired"
         fxrequired = submod.fxrequired    
-        allowedvalues = fxrequired_allowed_values()
         assert fxrequired in allowedvalues
 
-        superroot = git_toplevelroot(root_dir, logger)
-                                     
+        skipped = False
         if (
             fxrequired
             and ((superroot and "Toplevel" in fxrequired)
             or fxrequired not in requiredlist)
         ):
             if "Optional" in fxrequired and "Optional" not in requiredlist:
-                if fxrequired.startswith("Always"):
-                    print(f"Skipping optional component {name:>20}")
-                continue
-        optional = "AlwaysOptional" in requiredlist
-
-        if fxrequired in requiredlist:
-            submod.update()
-            repodir = os.path.join(root_dir, submod.path)
-            if os.path.exists(os.path.join(repodir, ".gitmodules")):
-                # recursively handle this checkout
-                print(f"Recursively checking out submodules of {name}")
-                gitsubmodules = GitModules(submod.logger, confpath=repodir)
-                newrequiredlist = ["AlwaysRequired"]
-                if optional:
-                    newrequiredlist.append("AlwaysOptional")
-                submodules_update(gitsubmodules, repodir, newrequiredlist, force=force)
+                skipped = True
+        selected.append(not skipped and fxrequired in requiredlist)
+
+    todo = [submod for submod, wanted in zip(submods, selected) if wanted]
+    # new submodules already in the superproject index are cloned by git in parallel
+    Submodule.init_submodules(GitInterface(root_dir, logger), todo, max_workers())
+
+    # the status queries and the fetches into existing checkouts (remote lookups
+    # and transfers) are independent, so run them concurrently; the updates share
+    # the superproject index and stay serial
+    with ThreadPoolExecutor(max_workers=max_workers()) as executor:
+        list(executor.map(_prepare_update, todo))
+
+    optional = "AlwaysOptional" in requiredlist
+    for submod, wanted in zip(submods, selected):
+        name = submod.name
+        if not wanted:
+            if "Optional" in submod.fxrequired and submod.fxrequired.startswith("Always"):
+                print(f"Skipping optional component {name:>20}")
+            continue
+
+        submod.update()
+        repodir = submod.repodir
+        if os.path.exists(os.path.join(repodir, ".gitmodules")):
+            # recursively handle this checkout
+            print(f"Recursively checking out submodules of {name}")
+            gitsubmodules = GitModules(submod.logger, confpath=repodir)
+            newrequiredlist = ["AlwaysRequired"]
+            if optional:
+                newrequiredlist.append("AlwaysOptional")
+            submodules_update(gitsubmodules, repodir, newrequiredlist, force=force)
 
 def local_mods_output():
     text = """\
@@ -312,9 +247,11 @@ def main():
         excludelist,
         force,
         action,
+        njobs,
     ) = commandline_arguments()
     # Get a logger for the package
-    global logger
+    global logger, jobs
+    jobs = njobs
     logger = logging.getLogger(__name__)
 
     logger.info("action is {} root_dir={} file_name={}".format(action, root_dir, file_name))
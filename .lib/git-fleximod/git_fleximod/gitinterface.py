@@ -1,11 +1,21 @@
 import os
+import shlex
 import sys
 from . import utils
 from pathlib import Path
 
+# Do not use ssh interface
+SSH_PREFIX = "git@github.com:"
+HTTPS_PREFIX = "https://github.com/"
+
+def _https_args(args):
+    """Return args with any github ssh url rewritten to https"""
+    return [a.replace(SSH_PREFIX, HTTPS_PREFIX) if isinstance(a, str) and SSH_PREFIX in a else a
+            for a in args]
+
 class GitInterface:
     def __init__(self, repo_path, logger):
-        logger.debug("Initialize GitInterface for {}".format(repo_path))
+        logger.debug(f"Initialize GitInterface for {repo_path}")
         if isinstance(repo_path, str):
             self.repo_path = Path(repo_path).resolve()
         elif isinstance(repo_path, Path):
@@ -49,14 +59,12 @@ class GitInterface:
 
     # pylint: disable=unused-argument
     def git_operation(self, operation, *args, **kwargs):
-        newargs = []
-        for a in args:
-            # Do not use ssh interface
-            if isinstance(a, str):
-                a = a.replace("git@github.com:", "https://github.com/")
-            newargs.append(a)
+        """Run a git operation and return (status, output)
 
-        command = self._git_command(operation, *newargs)
+        The output is text without its trailing newline, from either interface,
+        so callers do not need to strip it again.
+        """
+        command = self._git_command(operation, *_https_args(args))
         if isinstance(command, list):
             try:
                 status, output = utils.execute_subprocess(command, status_to_caller=True, output_to_caller=True)
@@ -66,6 +74,45 @@ class GitInterface:
         else:
             return 0, command
 
+    def git_operations(self, *operations):
+        """Run several git operations one after the other
+
+        Each operation is a tuple (operation, *args).  With the shell interface they
+        are chained into a single sh -c call rather than one subprocess round trip
+        each.  With either interface a failure is not fatal and does not stop the
+        later operations, the status returned is that of the last operation.
+        """
+        if self._use_module:
+            for operation, *args in operations:
+                self.logger.info(operation)
+                status, output, _ = getattr(self.repo.git, operation)(
+                    *_https_args(args), with_exceptions=False, with_extended_output=True)
+            return status, output.rstrip()
+        commands = []
+        for operation, *args in operations:
+            self.logger.info(operation)
+            command = ["git", "-C", str(self.repo_path), operation] + _https_args(args)
+            commands.append(" ".join(shlex.quote(str(c)) for c in command))
+        try:
+            status, output = utils.execute_subprocess(["sh", "-c", "; ".join(commands)], status_to_caller=True, output_to_caller=True)
+            return status, output.rstrip()
+        except Exception as e:
+            sys.exit(e)
+
+    def git_status(self, operation, *args):
+        """Return only the exit status of a git command, a non-zero status is not fatal
+
+        For commands like `diff --quiet` the answer is in the exit status, no output
+        needs to be collected.
+        """
+        args = _https_args(args)
+        if self._use_module and operation != "submodule":
+            self.logger.info(operation)
+            status, _, _ = getattr(self.repo.git, operation)(
+                *args, with_exceptions=False, with_extended_output=True)
+            return status
+        return utils.execute_subprocess(self._git_command(operation, *args), status_to_caller=True)
+
     def config_get_value(self, section, name):
         if self._use_module:
             config = self.repo.config_reader()
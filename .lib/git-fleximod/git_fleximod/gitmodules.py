@@ -1,7 +1,10 @@
+import re
 import shutil, os
 from pathlib import Path
 from configparser import RawConfigParser, ConfigParser
-from .lstripreader import LstripReader
+
+# .gitmodules entries are indented, configparser wants them at the start of the line
+_LEADING_WHITESPACE = re.compile(r"^[ \t]+", re.MULTILINE)
 
 
 class GitModules(RawConfigParser):
@@ -21,22 +24,32 @@ class GitModules(RawConfigParser):
         """
         self.logger = logger
         self.logger.debug(
-            "Creating a GitModules object {} {} {} {}".format(
-                confpath, conffile, includelist, excludelist
-            )
+            "Creating a GitModules object %s %s %s %s",
+            confpath, conffile, includelist, excludelist,
         )
+        # the names sections() returns, kept until a section is added or the file reread
+        self._names = None
         super().__init__()
         self.conf_file = (Path(confpath) / Path(conffile))
-        if self.conf_file.exists():
-            self.read_file(LstripReader(str(self.conf_file)), source=conffile)
-        self.includelist = includelist
-        self.excludelist = excludelist
+        self._read_conf_file(conffile)
+        # sections() tests every submodule name against these
+        self.includelist = set(includelist) if includelist else includelist
+        self.excludelist = set(excludelist) if excludelist else excludelist
         self.isdirty = False
         
+    def _read_conf_file(self, source):
+        """Read conf_file if there is one, stripping the indentation in a single pass"""
+        try:
+            with open(self.conf_file) as f:
+                text = f.read()
+        except FileNotFoundError:
+            return
+        self.read_string(_LEADING_WHITESPACE.sub("", text), source=str(source))
+
     def reload(self):
         self.clear()
-        if self.conf_file.exists():
-            self.read_file(LstripReader(str(self.conf_file)), source=self.conf_file)
+        self._names = None
+        self._read_conf_file(self.conf_file)
 
         
     def set(self, name, option, value):
@@ -44,13 +57,18 @@ class GitModules(RawConfigParser):
         Sets a configuration value for a specific submodule:
         Ensures the appropriate section exists for the submodule.
         Calls the parent class's set method to store the value.
+        Only a changed value marks the file for save() to write.
         """
-        self.isdirty = True
-        self.logger.debug("set called {} {} {}".format(name, option, value))
+        self.logger.debug("set called %s %s %s", name, option, value)
         section = f'submodule "{name}"'
+        value = str(value)
         if not self.has_section(section):
             self.add_section(section)
-        super().set(section, option, str(value))
+            self._names = None
+        elif RawConfigParser.get(self, section, option, fallback=None) == value:
+            return
+        self.isdirty = True
+        super().set(section, option, value)
 
     # pylint: disable=redefined-builtin, arguments-differ
     def get(self, name, option, raw=False, vars=None, fallback=None):
@@ -59,7 +77,7 @@ class GitModules(RawConfigParser):
         Uses the parent class's get method to access the value.
         Handles potential errors if the section or option doesn't exist.
         """
-        self.logger.debug("git get called {} {}".format(name, option))
+        self.logger.debug("git get called %s %s", name, option)
         section = f'submodule "{name}"'
         try:
             return ConfigParser.get(
@@ -69,29 +87,29 @@ class GitModules(RawConfigParser):
             return None
 
     def save(self):
+        """Write the file if set() changed anything, callers that set values must save"""
         if self.isdirty:
-            self.logger.info("Writing {}".format(self.conf_file))
+            self.logger.info("Writing %s", self.conf_file)
             with open(self.conf_file, "w") as fd:
                 self.write(fd)
         self.isdirty = False
-        
-    def __del__(self):
-        self.save()
 
     def sections(self):
         """Strip the submodule part out of section and just use the name"""
         self.logger.debug("calling GitModules sections iterator")
-        names = []
-        for section in ConfigParser.sections(self):
-            name = section[11:-1]
-            if self.includelist and name not in self.includelist:
-                continue
-            if self.excludelist and name in self.excludelist:
-                continue
-            names.append(name)
-        return names
+        if self._names is None:
+            names = []
+            for section in ConfigParser.sections(self):
+                name = section[11:-1]
+                if self.includelist and name not in self.includelist:
+                    continue
+                if self.excludelist and name in self.excludelist:
+                    continue
+                names.append(name)
+            self._names = names
+        return list(self._names)
 
     def items(self, name, raw=False, vars=None):
-        self.logger.debug("calling GitModules items for {}".format(name))
+        self.logger.debug("calling GitModules items for %s", name)
         section = f'submodule "{name}"'
         return ConfigParser.items(section, raw=raw, vars=vars)
@@ -7,7 +7,6 @@ import argparse
 import logging
 from git_fleximod.gitinterface import GitInterface
 from git_fleximod.gitmodules import GitModules
-from git_fleximod import utils
 
 logger = None
 
@@ -162,9 +161,8 @@ class ExternalRepoTranslator:
                     self.git.git_operation("clone", "-b", tag, "--depth", "1", url, path)
                 except:
                     self.git.git_operation("clone", url, path)
-                    with utils.pushd(newpath):
-                        ngit = GitInterface(newpath, logger)
-                        ngit.git_operation("checkout", tag)
+                    ngit = GitInterface(newpath, logger)
+                    ngit.git_operation("checkout", tag)
             if hash_:
                 self.git.git_operation("clone", url, path)
                 git = GitInterface(newpath, logger)
@@ -208,7 +206,7 @@ class ExternalRepoTranslator:
         for section in econfig.sections():
             if section == "externals_description":
                 logger.info("skipping section {}".format(section))
-                return
+                break
             logger.info("Translating section {}".format(section))
             tag = econfig.get(section, "tag", raw=False, fallback=None)
             url = econfig.get(section, "repo_url", raw=False, fallback=None)
@@ -220,16 +218,20 @@ class ExternalRepoTranslator:
 
             self.translate_single_repo(section, tag, url, path, efile, hash_, sparse, protocol)
 
+        self.gitmodules.save()
+
 
 
 def _main():
     rootpath, gitmodules, externals = commandline_arguments()
     global logger
     logger = logging.getLogger(__name__)
-    with utils.pushd(rootpath):
-        t = ExternalRepoTranslator(Path(rootpath), gitmodules, externals)
-        logger.info("Translating {}".format(rootpath))
-        t.translate_repo()
+    # every path below is taken relative to rootpath and git runs with -C, so
+    # there is no need to change the working directory of the process
+    rootpath = Path(rootpath).resolve()
+    t = ExternalRepoTranslator(rootpath, gitmodules, externals)
+    logger.info("Translating {}".format(rootpath))
+    t.translate_repo()
 
         
 if __name__ == "__main__":
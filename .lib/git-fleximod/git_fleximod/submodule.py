@@ -1,11 +1,23 @@
 import os
+import functools
+import hashlib
 import textwrap
 import shutil
 import string
+import tempfile
+import threading
 from configparser import NoOptionError
 from git_fleximod import utils
 from git_fleximod.gitinterface import GitInterface
 
+HEXDIGITS = frozenset(string.digits + "abcdef")
+
+def _is_hash(ref):
+    """Trying to distinguish a tag from a hash, without asking git"""
+    # git never abbreviates a hash below 7 characters, shorter hex names are tags;
+    # the length test is cheap and rules out most tags before the character scan
+    return 7 <= len(ref) <= 40 and HEXDIGITS.issuperset(ref)
+
 class Submodule():
     """
     Represents a Git submodule with enhanced features for flexible management.
@@ -14,6 +26,7 @@ class Submodule():
         name (str): The name of the submodule.
         root_dir (str): The root directory of the main project.
         path (str): The relative path from the root directory to the submodule.
+        repodir (str): The submodule directory, path joined to root_dir.
         url (str): The URL of the submodule repository.
         fxurl (str): The URL for flexible submodule management (optional).
         fxtag (str): The tag for flexible submodule management (optional).
@@ -21,6 +34,13 @@ class Submodule():
         fxrequired (str): Indicates if the submodule is optional or required (optional).
         logger (logging.Logger): Logger instance for logging (optional).
     """
+    # parsed ls-remote --tags keyed by url, superproject gitlinks keyed by
+    # superproject path and remotes keyed by repo path, shared by all instances
+    _ls_remote_cache = {}
+    _gitlinks_cache = {}
+    _remotes_cache = {}
+    _cache_lock = threading.Lock()
+
     def __init__(self, root_dir, name, path, url, fxtag=None, fxurl=None, fxsparse=None, fxrequired=None, logger=None):
         """
         Initializes a new Submodule instance with the provided attributes.
@@ -28,8 +48,15 @@ class Submodule():
         self.name = name
         self.root_dir = root_dir
         self.path = path 
+        self.repodir = os.path.join(root_dir, path)
         self.url = url
         self.fxurl = fxurl
+        # status and update ask all through whether fxtag is a hash, decide it once;
+        # git prints hashes in lower case, a hash pinned in upper case would
+        # otherwise be taken for a tag and looked up on the remote
+        self._fxtag_is_hash = bool(fxtag) and _is_hash(fxtag.lower())
+        if self._fxtag_is_hash:
+            fxtag = fxtag.lower()
         self.fxtag = fxtag
         self.fxsparse = fxsparse
         if fxrequired:
@@ -37,7 +64,22 @@ class Submodule():
         else:
             self.fxrequired = "AlwaysRequired"
         self.logger = logger
+        # whether the submodule has a .git, see checked_out()
+        self._checked_out = None
+        # (head, commit) from _resolve_fxtag, until a checkout or fetch changes them
+        self._resolved = None
        
+    def checked_out(self):
+        """
+        Returns True if the submodule directory has a .git, that is it is checked out.
+
+        status and update both ask, on a large tree that is a stat per submodule
+        each time; the answer is kept until update changes the checkout.
+        """
+        if self._checked_out is None:
+            self._checked_out = os.path.exists(os.path.join(self.repodir, ".git"))
+        return self._checked_out
+
     def status(self):
         """
         Checks the status of the submodule and returns 4 parameters:
@@ -47,7 +89,7 @@ class Submodule():
         - testfails (bool): An indicator if the submodule has failed a test, this is used for testing purposes.        
         """
 
-        smpath = os.path.join(self.root_dir, self.path)
+        smpath = self.repodir
         testfails = False
         localmods = False
         needsupdate = False
@@ -57,34 +99,27 @@ class Submodule():
             optional = " (optional)" 
         required = None
         level = None
-        if not os.path.exists(os.path.join(smpath, ".git")):
+        if not self.checked_out():
             rootgit = GitInterface(self.root_dir, self.logger)
             # submodule commands use path, not name
-            status, tags = rootgit.git_operation("ls-remote", "--tags", self.url)
-            status, result = rootgit.git_operation("submodule","status",smpath)
-            result = result.split()
-            
-            if result:
-                ahash = result[0][1:]
+            ahash = self._index_hash(rootgit)
+            if self._fxtag_is_hash and ahash and ahash.startswith(self.fxtag):
+                # pinned to the hash the superproject records, the remote tags can't change that
+                result = f"e {self.name:>20} not checked out, aligned at hash {self.fxtag}{optional}"
+                needsupdate = True
+                return result, needsupdate, localmods, testfails
             hhash = None
             atag = None
-            for htag in tags.split("\n"):
-                if htag.endswith('^{}'):
-                    htag = htag[:-3]
-                if ahash and not atag and ahash in htag:
-                    atag = (htag.split()[1])[10:]
-                if self.fxtag and not hhash and htag.endswith(self.fxtag):
-                    hhash = htag.split()[0]
-                if hhash and atag:
-                    break
+            # only contact the remote when there is an fxtag to look up
+            if self.fxtag:
+                by_tag, by_hash = self._ls_remote_tags(rootgit)
+                hhash = by_tag.get(self.fxtag)
+                atag = by_hash.get(ahash)
             if self.fxtag and (ahash == hhash or atag == self.fxtag):
                 result = f"e {self.name:>20} not checked out, aligned at tag {self.fxtag}{optional}"
                 needsupdate = True
             elif self.fxtag:
-                status, ahash = rootgit.git_operation(
-                    "submodule", "status", "{}".format(self.path)
-                )
-                ahash = ahash[1 : len(self.fxtag) + 1]
+                ahash = ahash[: len(self.fxtag)] if ahash else ""
                 if self.fxtag == ahash:
                     result = f"e {self.name:>20} not checked out, aligned at hash {ahash}{optional}"
                 else:
@@ -95,40 +130,42 @@ class Submodule():
                 result = f"e {self.name:>20} has no fxtag defined in .gitmodules{optional}"
                 testfails = False
         else:
-            with utils.pushd(smpath):
-                git = GitInterface(smpath, self.logger)
-                status, remote = git.git_operation("remote")
-                if remote == '':
-                    result = f"e {self.name:>20} has no associated remote"
-                    testfails = True
-                    needsupdate = True
-                    return result, needsupdate, localmods, testfails                    
-                status, rurl = git.git_operation("ls-remote","--get-url")
-                status, lines = git.git_operation("log", "--pretty=format:\"%h %d\"")
-                line = lines.partition('\n')[0]
-                parts = line.split()
-                ahash = parts[0][1:]
-                atag = None
-                if len(parts) > 3:
-                    idx = 0
-                    while idx < len(parts)-1:
-                        idx = idx+1
-                        if parts[idx] == 'tag:':
-                            atag = parts[idx+1]
-                            while atag.endswith(')') or atag.endswith(',') or atag.endswith("\""):
-                                atag = atag[:-1]
-                            if atag == self.fxtag:
-                                break
+            git = GitInterface(smpath, self.logger)
+            remotes = self._remote_urls(git)
+            if not remotes:
+                result = f"e {self.name:>20} has no associated remote"
+                testfails = True
+                needsupdate = True
+                return result, needsupdate, localmods, testfails                    
+            recurse = False
+            # only add (and fetch) a remote when no existing remote points at the url
+            if not self._find_remote(remotes):
+                remote = self._add_remote(git)
+                # a url change often keeps the pinned tag or hash, which is then
+                # already here; only go to the network when it is missing
+                if not self.fxtag:
+                    git.git_operation("fetch", remote)
+                elif self._fxtag_is_hash:
+                    if git.git_status("cat-file", "-e", f"{self.fxtag}^{{commit}}"):
+                        git.git_operation("fetch", *self._depth_args(git), remote)
+                else:
+                    tag = f"refs/tags/{self.fxtag}"
+                    if git.git_status("cat-file", "-e", f"{tag}^{{commit}}"):
+                        # status only needs the pinned tag from the new remote; it may
+                        # not be there, so the fetch must not be fatal
+                        git.git_status("fetch", *self._depth_args(git), "--no-tags", remote, f"{tag}:{tag}")
+            result = self._at_fxtag_result(git) if self.fxtag else None
+            if result:
+                recurse = True
+                testfails = False
+            else:
+                _, line = git.git_operation("log", "-1", "--pretty=format:\"%h %d\"")
+                ahash, atag = self._parse_log_line(line, self.fxtag)
 
-                
                 #print(f"line is {line} ahash is {ahash} atag is {atag} {parts}")
                 #                atag = git.git_operation("describe", "--tags", "--always")
                 # ahash =  git.git_operation("rev-list", "HEAD").partition("\n")[0]
-                    
-                recurse = False
-                if rurl != self.url:
-                    remote = self._add_remote(git)
-                    git.git_operation("fetch", remote)
+
                 if self.fxtag and atag == self.fxtag:
                     result = f"  {self.name:>20} at tag {self.fxtag}"
                     recurse = True
@@ -150,15 +187,227 @@ class Submodule():
                     else:
                         result = f"e {self.name:>20} has no fxtag defined in .gitmodules, module at {ahash}"
                     testfails = False
-                    
-                status, output = git.git_operation("status", "--ignore-submodules", "-uno")
-                if "nothing to commit" not in output:
-                    localmods = True
-                    result = "M" + textwrap.indent(output, "                      ")
+
+            # the exit status of diff --quiet is enough to detect local changes, only
+            # ask for the verbose report when there is something to show
+            if git.git_status("diff", "--quiet", "--ignore-submodules", "HEAD"):
+                localmods = True
+                _, output = git.git_operation("status", "--ignore-submodules", "-uno")
+                result = "M" + textwrap.indent(output, "                      ")
 #        print(f"result {result} needsupdate {needsupdate} localmods {localmods} testfails {testfails}")
         return result, needsupdate, localmods, testfails
 
-    
+
+    @staticmethod
+    @functools.lru_cache(maxsize=256)
+    def _parse_log_line(line, fxtag):
+        """
+        Parses a `git log --pretty=format:"%h %d"` line into the hash and tag of that commit.
+
+        The parse only depends on its arguments, so results are memoized; nested trees
+        frequently pin the same commit in several places.
+
+        Args:
+            line (str): The first line of the log output.
+            fxtag (str): The expected tag, preferred when the commit carries several tags.
+
+        Returns:
+            tuple: (ahash, atag), atag is None if the commit is not tagged.
+        """
+        # strip the quotes and parentheses by position, a character set strip
+        # would also eat a tag name ending in ')' or '"'
+        if line[:1] == '"' and line[-1:] == '"':
+            line = line[1:-1]
+        ahash, _, decoration = line.partition(" ")
+        # decoration looks like " (HEAD, tag: v1, tag: v2, origin/main)"
+        decoration = decoration.strip()
+        if decoration[:1] == "(" and decoration[-1:] == ")":
+            decoration = decoration[1:-1]
+        atag = None
+        for ref in decoration.split(", "):
+            if ref.startswith("tag: "):
+                atag = ref[5:]
+                if atag == fxtag:
+                    break
+        return ahash, atag
+
+    def _at_fxtag_result(self, git):
+        """
+        Returns the status line for a submodule whose HEAD is at fxtag, or None.
+
+        Testing fxtag directly takes one rev-parse, while decorating HEAD with
+        `git log --pretty=%d` loads every ref in the repository; the log is only
+        needed to describe a submodule that is somewhere else.
+
+        Args:
+            git (GitInterface): An instance of GitInterface for the submodule.
+        """
+        if self._fxtag_is_hash:
+            # --short abbreviates HEAD the same way %h does
+            _, ahash = git.git_operation("rev-parse", "--short", "HEAD")
+            if ahash.startswith(self.fxtag) or self.fxtag.startswith(ahash):
+                return f"  {self.name:>20} at hash {ahash}"
+        else:
+            head, commit = self._resolve_fxtag(git)
+            if commit and head == commit:
+                return f"  {self.name:>20} at tag {self.fxtag}"
+        return None
+
+    def _resolve_fxtag(self, git):
+        """
+        Returns (head, commit), the submodule HEAD and the commit fxtag names there.
+
+        Both come from a single `git rev-parse --revs-only`, which leaves out names that
+        do not resolve rather than failing, so commit is "" when the tag or hash is not
+        in the repository yet and HEAD is at fxtag when head == commit.
+
+        status and update ask for the same submodule in turn; the answer is kept
+        until update checks something out or fetches, which reset self._resolved.
+
+        Args:
+            git (GitInterface): An instance of GitInterface for the submodule.
+        """
+        if self._resolved is None:
+            ref = self.fxtag if self._fxtag_is_hash else f"refs/tags/{self.fxtag}"
+            _, output = git.git_operation("rev-parse", "--revs-only", "HEAD", f"{ref}^{{commit}}")
+            head, _, commit = output.partition("\n")
+            self._resolved = (head, commit)
+        return self._resolved
+
+    def _reference_repo(self):
+        """
+        Returns the path of the shared object cache for the submodule's URL, or None.
+
+        When the GIT_FLEXIMOD_CACHE environment variable names a directory, a bare mirror
+        of each url is kept there and new clones borrow objects from it with --dissociate,
+        so the checkout does not depend on the cache afterwards.
+        """
+        cache = os.environ.get("GIT_FLEXIMOD_CACHE")
+        if not cache:
+            return None
+        digest = hashlib.sha1(self.url.encode()).hexdigest()
+        return os.path.join(os.path.abspath(os.path.expanduser(cache)), digest + ".git")
+
+    def _update_reference_repo(self, git):
+        """
+        Creates or refreshes the shared object cache for the submodule's URL ahead of a clone.
+
+        Returns the path of the mirror, or None if there is no cache or it could not be made.
+        A new mirror is cloned into a temporary directory in the cache and renamed into place,
+        so another sandbox never finds a partly written one to clone from.
+        """
+        refrepo = self._reference_repo()
+        if not refrepo:
+            return None
+        if os.path.isdir(refrepo):
+            # a bare mirror, GitInterface would take it for a directory needing git init
+            utils.execute_subprocess(["git", "-C", refrepo, "remote", "update", "--prune"],
+                                     status_to_caller=True)
+            return refrepo
+        cache = os.path.dirname(refrepo)
+        os.makedirs(cache, exist_ok=True)
+        tmpdir = tempfile.mkdtemp(prefix=".tmp-", dir=cache)
+        if not git.git_status("clone", "--mirror", "--quiet", self.url, tmpdir):
+            try:
+                os.rename(tmpdir, refrepo)
+            except OSError:
+                # another sandbox put its mirror in place first
+                pass
+        shutil.rmtree(tmpdir, ignore_errors=True)
+        return refrepo if os.path.isdir(refrepo) else None
+
+    @staticmethod
+    def _filter_args():
+        """
+        Returns the partial clone arguments for new submodule clones, or an empty list.
+
+        When the GIT_FLEXIMOD_FILTER environment variable holds a filter spec, for example
+        blob:none, new clones are partial: file contents are downloaded for the commits
+        that get checked out rather than for the whole history.
+        """
+        spec = os.environ.get("GIT_FLEXIMOD_FILTER")
+        return [f"--filter={spec}"] if spec else []
+
+    def _depth_args(self, git):
+        """
+        Returns the depth argument for fetching fxtag into the submodule, or an empty list.
+
+        Only a repository git-fleximod creates for a single tag is shallow: a new sparse
+        repository or the clone of an ssh url.  Fetching another tag into it keeps depth 1,
+        rather than deepening it by whatever history lies between the tags; a hash can only
+        be found in the history, so it unshallows the repository.  A complete repository is
+        never depth limited.
+
+        Args:
+            git (GitInterface): An instance of GitInterface for the submodule.
+        """
+        _, shallow = git.git_operation("rev-parse", "--is-shallow-repository")
+        if shallow != "true":
+            return []
+        return ["--unshallow"] if self._fxtag_is_hash else ["--depth=1"]
+
+    def _ls_remote_tags(self, git):
+        """
+        Returns the tags on the submodule url as two lookup dicts.
+
+        The `git ls-remote --tags` output is parsed once into {tag: hash} and
+        {hash: tag}, keeping the first line for each key as ls-remote lists it, so an
+        annotated tag maps to its tag object and its peeled commit maps back to the tag.
+        Several submodules often share a url, the result is cached per url for the
+        life of the process so the remote is only contacted once.
+
+        Args:
+            git (GitInterface): An instance of GitInterface to perform git operations.
+
+        Returns:
+            tuple: (by_tag, by_hash) dicts.
+        """
+        with Submodule._cache_lock:
+            tags = Submodule._ls_remote_cache.get(self.url)
+        if tags is None:
+            status, output = git.git_operation("ls-remote", "--tags", self.url)
+            by_tag = {}
+            by_hash = {}
+            # ls-remote lines are "<hash>\trefs/tags/<tag>", peeled tags end in ^{}
+            for line in output.splitlines():
+                lhash, _, lref = line.partition("\t")
+                if not lref.startswith("refs/tags/"):
+                    continue
+                tag = lref[10:-3] if lref.endswith("^{}") else lref[10:]
+                by_tag.setdefault(tag, lhash)
+                by_hash.setdefault(lhash, tag)
+            tags = (by_tag, by_hash)
+            # a failed query (no network, say) is not remembered as a url without tags
+            if not status:
+                with Submodule._cache_lock:
+                    Submodule._ls_remote_cache[self.url] = tags
+        return tags
+
+    def _index_hash(self, rootgit):
+        """
+        Returns the commit recorded for the submodule in the superproject index, or None.
+
+        Rather than running `git submodule status <path>` for each submodule, the gitlink
+        entries of the superproject are read with one `git ls-files --stage` and cached
+        per superproject.
+
+        Args:
+            rootgit (GitInterface): An instance of GitInterface for the superproject.
+        """
+        key = str(rootgit.repo_path)
+        with Submodule._cache_lock:
+            links = Submodule._gitlinks_cache.get(key)
+        if links is None:
+            _, output = rootgit.git_operation("ls-files", "--stage", "-z")
+            links = {}
+            for entry in output.split("\0"):
+                info, _, path = entry.partition("\t")
+                if info.startswith("160000 "):
+                    links[path] = info.split()[1]
+            with Submodule._cache_lock:
+                Submodule._gitlinks_cache[key] = links
+        return links.get(os.path.normpath(self.path))
+
     def _add_remote(self, git):
         """
         Adds a new remote to the submodule if it does not already exist.
@@ -173,27 +422,69 @@ class Submodule():
         Returns:
             str: The name of the new remote if added, or the name of the existing remote that matches the submodule's URL.
         """ 
-        status, remotes = git.git_operation("remote", "-v")
-        remotes = remotes.splitlines()
-        upstream = None
+        remotes = self._remote_urls(git)
         if remotes:
-            status, upstream = git.git_operation("ls-remote", "--get-url")
-            newremote = "newremote.00"
-            tmpurl = self.url.replace("git@github.com:", "https://github.com/")
-            line = next((s for s in remotes if self.url in s or tmpurl in s), None)
-            if line:
-                newremote = line.split()[0]
+            newremote = self._find_remote(remotes)
+            if newremote:
                 return newremote
-            else:
-                i = 0
-                while newremote in remotes:
-                    i = i + 1
-                    newremote = f"newremote.{i:02d}"
+            names = set(remotes.values())
+            newremote = "newremote.00"
+            i = 0
+            while newremote in names:
+                i = i + 1
+                newremote = f"newremote.{i:02d}"
         else:
             newremote = "origin"
         git.git_operation("remote", "add", newremote, self.url)
+        with Submodule._cache_lock:
+            Submodule._remotes_cache[str(git.repo_path)] = {**remotes, self.url: newremote}
         return newremote
 
+    def _find_remote(self, remotes):
+        """
+        Returns the name of the remote pointing at the submodule's URL, or None.
+
+        Args:
+            remotes (dict): {url: name} as returned by _remote_urls.
+        """
+        tmpurl = self.url.replace("git@github.com:", "https://github.com/")
+        name = remotes.get(self.url) or remotes.get(tmpurl)
+        if not name:
+            name = next((name for url, name in remotes.items() if self.url in url or tmpurl in url), None)
+        return name
+
+    @staticmethod
+    def _remote_urls(git):
+        """
+        Returns a dict mapping each remote fetch url to the remote name.
+
+        `git remote -v` lists every remote twice, once for fetch and once for push,
+        only the fetch rows are kept. status and update both ask for the remotes of
+        the same repository, so the result is cached per repository path.
+
+        Args:
+            git (GitInterface): An instance of GitInterface to perform git operations.
+
+        Returns:
+            dict: {url: name} for the remotes defined in the repository.
+        """
+        key = str(git.repo_path)
+        with Submodule._cache_lock:
+            remotes = Submodule._remotes_cache.get(key)
+        if remotes is None:
+            _, output = git.git_operation("remote", "-v")
+            remotes = {}
+            # lines are "<name>\t<url> (fetch)", partial clones append the filter,
+            # e.g. " [blob:none]"; slice rather than split so urls may contain spaces
+            for line in output.splitlines():
+                name, _, rest = line.partition("\t")
+                end = rest.rfind(" (fetch)")
+                if end > 0:
+                    remotes.setdefault(rest[:end], name)
+            with Submodule._cache_lock:
+                Submodule._remotes_cache[key] = remotes
+        return remotes
+
     def toplevel(self):
         """
         Returns True if the submodule is Toplevel (either Required or Optional)
@@ -215,11 +506,11 @@ class Submodule():
         Returns:
             None
         """ 
-        self.logger.info("Called sparse_checkout for {}".format(self.name))
+        self.logger.info(f"Called sparse_checkout for {self.name}")
         rgit = GitInterface(self.root_dir, self.logger)
         status, superroot = rgit.git_operation("rev-parse", "--show-superproject-working-tree")
         if superroot:
-            gitroot = superroot.strip()
+            gitroot = superroot
         else:
             gitroot = self.root_dir
         # Now need to move the .git dir to the submodule location
@@ -230,33 +521,41 @@ class Submodule():
                 if line.startswith("gitdir: "):
                     rootdotgit = os.path.abspath(os.path.join(self.root_dir,line[8:]))
         assert os.path.isdir(rootdotgit)
-        # first create the module directory
-        if not os.path.isdir(os.path.join(self.root_dir, self.path)):
-            os.makedirs(os.path.join(self.root_dir, self.path))
+        # one stat of .git answers for the module directory too, the directory
+        # itself is only looked at when there is no .git in it
+        sprep_repo = self.repodir
+        try:
+            os.stat(os.path.join(sprep_repo, ".git"))
+            git_exists = True
+        except FileNotFoundError:
+            git_exists = False
+            # first create the module directory
+            os.makedirs(sprep_repo, exist_ok=True)
 
         # initialize a new git repo and set the sparse checkout flag
-        sprep_repo = os.path.join(self.root_dir, self.path)
         sprepo_git = GitInterface(sprep_repo, self.logger)
-        if os.path.exists(os.path.join(sprep_repo, ".git")):
+        if git_exists:
             try:
-                self.logger.info("Submodule {} found".format(self.name))
+                self.logger.info(f"Submodule {self.name} found")
                 chk = sprepo_git.config_get_value("core", "sparseCheckout")
                 if chk == "true":
-                    self.logger.info("Sparse submodule {} already checked out".format(self.name))
+                    self.logger.info(f"Sparse submodule {self.name} already checked out")
                     return
             except (NoOptionError):
-                self.logger.debug("Sparse submodule {} not present".format(self.name))
+                self.logger.debug(f"Sparse submodule {self.name} not present")
             except Exception as e:
-                utils.fatal_error("Unexpected error {} occured.".format(e))
+                utils.fatal_error(f"Unexpected error {e} occured.")
 
         sprepo_git.config_set_value("core", "sparseCheckout", "true")
 
         # set the repository remote
         
-        self.logger.info("Setting remote origin in {}/{}".format(self.root_dir, self.path))
-        status, remotes = sprepo_git.git_operation("remote", "-v")
-        if self.url not in remotes:
+        self.logger.info(f"Setting remote origin in {self.root_dir}/{self.path}")
+        remotes = self._remote_urls(sprepo_git)
+        if not self._find_remote(remotes):
             sprepo_git.git_operation("remote", "add", "origin", self.url)
+            with Submodule._cache_lock:
+                Submodule._remotes_cache[str(sprepo_git.repo_path)] = {**remotes, self.url: "origin"}
 
         topgit = os.path.join(gitroot, ".git")
 
@@ -264,41 +563,50 @@ class Submodule():
             with open(os.path.join(self.root_dir, ".git")) as f:
                 gitpath = os.path.relpath(
                     os.path.join(self.root_dir, f.read().split()[1]),
-                    start=os.path.join(self.root_dir, self.path),
+                    start=self.repodir,
                 )
                 rootdotgit = os.path.join(gitpath, "modules", self.name)
         else:
             rootdotgit = os.path.relpath(
                 os.path.join(self.root_dir, ".git", "modules", self.name),
-                start=os.path.join(self.root_dir, self.path),
+                start=self.repodir,
             )
 
-        if os.path.isdir(os.path.join(self.root_dir, self.path, ".git")):
-            with utils.pushd(sprep_repo):
-                if os.path.isdir(os.path.join(rootdotgit,".git")):
-                    shutil.rmtree(os.path.join(rootdotgit,".git"))
-                shutil.move(".git", rootdotgit)
-                with open(".git", "w") as f:
-                    f.write("gitdir: " + os.path.relpath(rootdotgit))
-                infodir = os.path.join(rootdotgit, "info")
-                if not os.path.isdir(infodir):
-                    os.makedirs(infodir)
-                gitsparse = os.path.abspath(os.path.join(infodir, "sparse-checkout"))
+        if os.path.isdir(os.path.join(self.repodir, ".git")):
+            # rootdotgit and fxsparse are relative to the submodule directory
+            moddir = os.path.abspath(os.path.join(sprep_repo, rootdotgit))
+            if os.path.isdir(os.path.join(moddir, ".git")):
+                shutil.rmtree(os.path.join(moddir, ".git"))
+            shutil.move(os.path.join(sprep_repo, ".git"), moddir)
+            with open(os.path.join(sprep_repo, ".git"), "w") as f:
+                f.write("gitdir: " + os.path.relpath(moddir, start=sprep_repo))
+            infodir = os.path.join(moddir, "info")
+            if not os.path.isdir(infodir):
+                os.makedirs(infodir)
+            gitsparse = os.path.join(infodir, "sparse-checkout")
             if os.path.isfile(gitsparse):
                 self.logger.warning(
-                    "submodule {} is already initialized {}".format(self.name, rootdotgit)
+                    f"submodule {self.name} is already initialized {rootdotgit}"
                 )
                 return
 
-            with utils.pushd(sprep_repo):
-                if os.path.isfile(self.fxsparse):
-                    
-                    shutil.copy(self.fxsparse, gitsparse)
-                
+            sparsefile = os.path.join(sprep_repo, self.fxsparse)
+            if os.path.isfile(sparsefile):
+                shutil.copy(sparsefile, gitsparse)
+
 
-        # Finally checkout the repo
-        sprepo_git.git_operation("fetch", "origin", "--tags")
-        status,_ = sprepo_git.git_operation("checkout", self.fxtag)
+        # Finally checkout the repo; a new sparse repo only needs the pinned tag's
+        # commit, not the remote's history, an existing one keeps the depth it has
+        if git_exists:
+            depth = self._depth_args(sprepo_git)
+        else:
+            depth = [] if self._fxtag_is_hash else ["--depth=1"]
+        if self._fxtag_is_hash:
+            fetch = ("fetch", *depth, "origin", "--tags")
+        else:
+            tag = f"refs/tags/{self.fxtag}"
+            fetch = ("fetch", *depth, "--no-tags", "origin", f"{tag}:{tag}")
+        status,_ = sprepo_git.git_operations(fetch, ("checkout", self.fxtag))
         if status:
             print(f"Error checking out {self.name:>20} at {self.fxtag}")
         else:
@@ -307,6 +615,74 @@ class Submodule():
         rgit.config_set_value('submodule.' + self.name, "url", self.url)
         rgit.config_set_value('submodule.' + self.name, "path", self.path)
 
+    def fetch_fxtag(self):
+        """
+        Fetches fxtag into an existing, non sparse checkout when it is not there yet.
+
+        The fetch only writes to the submodule's own repository, so unlike update
+        it can run for several submodules at once; update then finds fxtag local
+        and only has to check it out.  A failed fetch is left for update to report.
+        """
+        if not self.fxtag or self.fxsparse or not self.checked_out():
+            return
+        git = GitInterface(self.repodir, self.logger)
+        remote = self._add_remote(git)
+        _, commit = self._resolve_fxtag(git)
+        if commit:
+            return
+        depth = self._depth_args(git)
+        if self._fxtag_is_hash:
+            git.git_status("fetch", *depth, remote, "--tags")
+        else:
+            tag = f"refs/tags/{self.fxtag}"
+            git.git_status("fetch", *depth, "--no-tags", remote, f"{tag}:{tag}")
+        self._resolved = None
+
+    def _clone(self, git, refargs):
+        """
+        Clones the submodule's URL into its path, shallowly when fxtag is a tag.
+
+        Only a single tag is wanted, so the full history is not transferred; if the
+        shallow clone fails, for instance on a server that refuses shallow requests,
+        the whole repository is cloned instead.  The shallow attempt uses git_status,
+        a failure there must not end the run with either interface.
+
+        Args:
+            git (GitInterface): An instance of GitInterface for the superproject.
+            refargs (list): Extra clone arguments, the filter and object cache.
+        """
+        status = 1
+        if self.fxtag and not self._fxtag_is_hash:
+            status = git.git_status("clone", *refargs, "--depth=1", "--branch", self.fxtag, self.url, self.path)
+        if status:
+            git.git_operation("clone", *refargs, self.url, self.path)
+
+    @staticmethod
+    def init_submodules(rootgit, submods, jobs):
+        """
+        Clones the submodules that the superproject index records but are not checked out.
+
+        update runs `git submodule update --init` for one path at a time; here the
+        plain ones (not sparse, not an ssh url, no object cache) go to a single call
+        with --jobs, so git clones them in parallel.  update then finds them checked
+        out and only has to move them to fxtag.
+
+        Args:
+            rootgit (GitInterface): An instance of GitInterface for the superproject.
+            submods (list): The Submodule instances about to be updated.
+            jobs (int): The number of clones git may run at once.
+        """
+        pending = [submod for submod in submods
+                   if submod.url and not submod.url.startswith("git@") and not submod.fxsparse
+                   and not submod.checked_out() and not submod._reference_repo()
+                   and submod._index_hash(rootgit)]
+        if not pending:
+            return
+        rootgit.git_operation("submodule", "update", "--init", f"--jobs={jobs}", *Submodule._filter_args(),
+                              "--", *(submod.path for submod in pending))
+        for submod in pending:
+            submod._checked_out = None
+
     def update(self):
         """
         Updates the submodule to the latest or specified version.
@@ -330,18 +706,26 @@ class Submodule():
             None
         """
         git = GitInterface(self.root_dir, self.logger)
-        repodir = os.path.join(self.root_dir, self.path)
-        self.logger.info("Checkout {} into {}/{}".format(self.name, self.root_dir, self.path))
+        repodir = self.repodir
+        self.logger.info(f"Checkout {self.name} into {self.root_dir}/{self.path}")
         # if url is provided update to the new url
         tag = None
-        repo_exists = False
-        if os.path.exists(os.path.join(repodir, ".git")):
-            self.logger.info("Submodule {} already checked out".format(self.name))
-            repo_exists = True
+        fxtag_is_tag = self.fxtag and not self._fxtag_is_hash
+        refrepo = None
+        repo_exists = self.checked_out()
+        if repo_exists:
+            self.logger.info(f"Submodule {self.name} already checked out")
+        else:
+            # the checkout below creates the .git, ask again next time
+            self._checked_out = None
+            if self.url and not self.fxsparse:
+                # the mirror is brought up to date first, the clone then copies from it
+                refrepo = self._update_reference_repo(git)
         # Look for a .gitmodules file in the newly checkedout repo
         if self.fxsparse:
             print(f"Sparse checkout {self.name} fxsparse {self.fxsparse}")
             self.sparse_checkout()
+            self._resolved = None
         else:
             if not repo_exists and self.url:
                 # ssh urls cause problems for those who dont have git accounts with ssh keys defined
@@ -349,11 +733,16 @@ class Submodule():
                 # opened with a GitModules object we don't need to worry about restoring the file here
                 # it will be done by the GitModules class
                 if self.url.startswith("git@"):
-                    git.git_operation("clone", self.url, self.path)
+                    refargs = self._filter_args()
+                    if refrepo:
+                        refargs += ["--reference-if-able", refrepo, "--dissociate"]
+                    self._clone(git, refargs)
                     smgit = GitInterface(repodir, self.logger)
-                    if not tag:
+                    # with an fxtag the checkout below decides where HEAD ends up,
+                    # describing the clone first would only walk its history
+                    if not self.fxtag:
                         status, tag = smgit.git_operation("describe", "--tags", "--always")
-                    smgit.git_operation("checkout", tag)
+                        smgit.git_operation("checkout", tag)
                     # Now need to move the .git dir to the submodule location
                     rootdotgit = os.path.join(self.root_dir, ".git")
                     if os.path.isfile(rootdotgit):
@@ -371,57 +760,69 @@ class Submodule():
                     with open(os.path.join(repodir, ".git"), "w") as f:
                         f.write("gitdir: " + os.path.relpath(newpath, start=repodir))
 
-            if not os.path.exists(repodir):
+            # an existing checkout implies the directory, only stat when there is none
+            if not repo_exists and not os.path.exists(repodir):
                 parent = os.path.dirname(repodir)
                 if not os.path.isdir(parent):
                     os.makedirs(parent)
-                git.git_operation("submodule", "add", "--name", self.name, "--", self.url, self.path) 
+                refargs = ["--reference", refrepo, "--dissociate"] if refrepo else []
+                git.git_operation("submodule", "add", "--name", self.name, *refargs, "--", self.url, self.path) 
+                with Submodule._cache_lock:
+                    Submodule._gitlinks_cache.pop(str(git.repo_path), None)
 
             if not repo_exists:
-                git.git_operation("submodule", "update", "--init", "--", self.path)
+                refargs = self._filter_args()
+                if refrepo:
+                    refargs += ["--reference", refrepo, "--dissociate"]
+                git.git_operation("submodule", "update", "--init", *refargs, "--", self.path)
 
             if self.fxtag:        
                 smgit = GitInterface(repodir, self.logger)
                 newremote = self._add_remote(smgit)
-                # Trying to distingush a tag from a hash
-                allowed = set(string.digits + 'abcdef') 
-                if not set(self.fxtag) <= allowed:
-                    # This is a tag
-                    tag = f"refs/tags/{self.fxtag}:refs/tags/{self.fxtag}"
-                    smgit.git_operation("fetch", newremote, tag)
-                smgit.git_operation("checkout", self.fxtag)
-
-            if not os.path.exists(os.path.join(repodir, ".git")):
+                head, commit = self._resolve_fxtag(smgit)
+                # an existing checkout already at fxtag needs neither a fetch nor a checkout
+                if not (repo_exists and commit and head == commit):
+                    if fxtag_is_tag and not commit:
+                        # This is a tag, only go to the remote for it if it is not already here
+                        tag = f"refs/tags/{self.fxtag}"
+                        smgit.git_operations(("fetch", *self._depth_args(smgit), "--no-tags", newremote, f"{tag}:{tag}"),
+                                             ("checkout", self.fxtag))
+                    else:
+                        smgit.git_operation("checkout", self.fxtag)
+                    self._resolved = None
+
+            if not repo_exists and not os.path.exists(os.path.join(repodir, ".git")):
                 utils.fatal_error(
                     f"Failed to checkout {self.name} {repo_exists} {repodir} {self.path}"
                 )
                 
 
         if os.path.exists(os.path.join(self.path, ".git")):
-            submoddir = os.path.join(self.root_dir, self.path)
-            with utils.pushd(submoddir):
-                git = GitInterface(submoddir, self.logger)
-                # first make sure the url is correct
-                newremote = self._add_remote(git)
-                status, tags = git.git_operation("tag", "-l")
-                fxtag = self.fxtag
-                if fxtag and fxtag not in tags:
-                    git.git_operation("fetch", newremote, "--tags")
-                status, atag = git.git_operation("describe", "--tags", "--always")
-                if fxtag and fxtag != atag:
+            submoddir = self.repodir
+            git = GitInterface(submoddir, self.logger)
+            # first make sure the url is correct
+            newremote = self._add_remote(git)
+            fxtag = self.fxtag
+            if not fxtag:
+                print(f"No fxtag found for submodule {self.name:>20}")
+            else:
+                head, commit = self._resolve_fxtag(git)
+                if commit and head == commit:
+                    print(f"{self.name:>20} up to date.")
+                else:
+                    operations = [("checkout", fxtag)]
+                    if not commit:
+                        # fetch just the one tag rather than every tag on the remote,
+                        # an abbreviated hash can't be fetched by name
+                        tag = f"refs/tags/{fxtag}"
+                        fetchargs = ["--tags"] if self._fxtag_is_hash else ["--no-tags", f"{tag}:{tag}"]
+                        operations.insert(0, ("fetch", *self._depth_args(git), newremote, *fetchargs))
                     try:
-                        status, _ = git.git_operation("checkout", fxtag)
+                        # fetch and checkout go to git in one shell call
+                        status, _ = git.git_operations(*operations)
                         if not status:
                             print(f"{self.name:>20} updated to {fxtag}")
                     except Exception as error:
                         print(error)
-                    
-
-                elif not fxtag:
-                    print(f"No fxtag found for submodule {self.name:>20}")
-                else:
-                    print(f"{self.name:>20} up to date.")
 
-
-                
         return
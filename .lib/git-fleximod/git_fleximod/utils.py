@@ -7,8 +7,6 @@ Common public utilities for manic package
 import logging
 import os
 import subprocess
-import sys
-from threading import Timer
 from pathlib import Path
 
 LOCAL_PATH_INDICATOR = "."
@@ -17,18 +15,6 @@ LOCAL_PATH_INDICATOR = "."
 # functions to massage text for output and other useful utilities
 #
 # ---------------------------------------------------------------------
-from contextlib import contextmanager
-
-
-@contextmanager
-def pushd(new_dir):
-    """context for chdir. usage: with pushd(new_dir)"""
-    previous_dir = os.getcwd()
-    os.chdir(new_dir)
-    try:
-        yield
-    finally:
-        os.chdir(previous_dir)
 
 
 def log_process_output(output):
@@ -37,7 +23,12 @@ def log_process_output(output):
     logging.debug(output) will only put log info heading on the first
     line. This makes it hard to filter with grep.
 
+    Unless debug logging is enabled nothing is split or logged, git
+    output can run to many lines.
+
     """
+    if not logging.getLogger().isEnabledFor(logging.DEBUG):
+        return
     output = output.split("\n")
     for line in output:
         logging.debug(line)
@@ -47,13 +38,12 @@ def printlog(msg, **kwargs):
     """Wrapper script around print to ensure that everything printed to
     the screen also gets logged.
 
+    stdout is not flushed after every message, pass flush=True for
+    output that has to appear at once.
+
     """
     logging.info(msg)
-    if kwargs:
-        print(msg, **kwargs)
-    else:
-        print(msg)
-    sys.stdout.flush()
+    print(msg, **kwargs)
 
 
 def find_upwards(root_dir, filename):
@@ -81,19 +71,26 @@ def last_n_lines(the_string, n_lines, truncation_message=None):
     If truncation_message is provided, the returned string begins with
     the given message if and only if the string is greater than n lines
     to begin with.
+
+    Lines are broken as str.splitlines breaks them.  Only the tail of
+    the_string is split up: every newline is also a line break, so the
+    last n lines lie after the n-th newline from the end.
     """
 
-    lines = the_string.splitlines(True)
-    if len(lines) <= n_lines:
-        return_val = the_string
-    else:
-        lines_subset = lines[-n_lines:]
-        str_truncated = "".join(lines_subset)
-        if truncation_message:
-            str_truncated = truncation_message + "\n" + str_truncated
-        return_val = str_truncated
+    # a trailing newline ends the last line rather than starting another
+    start = len(the_string) - 1 if the_string.endswith("\n") else len(the_string)
+    for _ in range(n_lines):
+        start = the_string.rfind("\n", 0, start)
+        if start < 0:
+            break
+    lines = the_string[start + 1:].splitlines(True)
+    if start < 0 and len(lines) <= n_lines:
+        return the_string
 
-    return return_val
+    str_truncated = "".join(lines[-n_lines:])
+    if truncation_message:
+        str_truncated = truncation_message + "\n" + str_truncated
+    return str_truncated
 
 
 def indent_string(the_string, indent_level):
@@ -135,17 +132,21 @@ def fatal_error(message):
 # Data conversion / manipulation
 #
 # ---------------------------------------------------------------------
+# the usual spellings, looked up as given before falling back to lower()
+_BOOL_STRINGS = {
+    "true": True, "True": True, "TRUE": True, "t": True, "T": True,
+    "false": False, "False": False, "FALSE": False, "f": False, "F": False,
+}
+
+
 def str_to_bool(bool_str):
     """Convert a sting representation of as boolean into a true boolean.
 
     Conversion should be case insensitive.
     """
-    value = None
-    str_lower = bool_str.lower()
-    if str_lower in ("true", "t"):
-        value = True
-    elif str_lower in ("false", "f"):
-        value = False
+    value = _BOOL_STRINGS.get(bool_str)
+    if value is None:
+        value = _BOOL_STRINGS.get(bool_str.lower())
     if value is None:
         msg = (
             'ERROR: invalid boolean string value "{0}". '
@@ -155,7 +156,8 @@ def str_to_bool(bool_str):
     return value
 
 
-REMOTE_PREFIXES = ["http://", "https://", "ssh://", "git@"]
+# a tuple so str.startswith can test them all in one call
+REMOTE_PREFIXES = ("http://", "https://", "ssh://", "git@")
 
 
 def is_remote_url(url):
@@ -164,11 +166,7 @@ def is_remote_url(url):
     path.
 
     """
-    remote_url = False
-    for prefix in REMOTE_PREFIXES:
-        if url.startswith(prefix):
-            remote_url = True
-    return remote_url
+    return url.startswith(REMOTE_PREFIXES)
 
 
 def split_remote_url(url):
@@ -180,14 +178,16 @@ def split_remote_url(url):
     if not remote_url:
         return url
 
-    for prefix in REMOTE_PREFIXES:
-        url = url.replace(prefix, "")
+    # only one prefix can match, strip it and keep what follows any
+    # user@ and host: parts
+    prefix = next(prefix for prefix in REMOTE_PREFIXES if url.startswith(prefix))
+    url = url[len(prefix):]
 
     if "@" in url:
-        url = url.split("@")[1]
+        url = url.partition("@")[2]
 
     if ":" in url:
-        url = url.split(":")[1]
+        url = url.partition(":")[2]
 
     return url
 
@@ -206,8 +206,12 @@ def expand_local_url(url, field):
         if url.strip() == LOCAL_PATH_INDICATOR:
             pass
         else:
-            url = os.path.expandvars(url)
-            url = os.path.expanduser(url)
+            # most local urls are plain paths, only run the expansions
+            # when there is a variable or a home directory to expand
+            if "$" in url:
+                url = os.path.expandvars(url)
+            if url.startswith("~"):
+                url = os.path.expanduser(url)
             if not os.path.isabs(url):
                 msg = (
                     'WARNING: Externals description for "{0}" contains a '
@@ -233,6 +237,9 @@ _HANGING_SEC = 300
 
 
 def _hanging_msg(working_directory, command):
+    if working_directory is None:
+        working_directory = os.getcwd()
+    command = " ".join(str(element) for element in command)
     print(
         """
 
@@ -252,52 +259,65 @@ repositories without entering your authentication information.
             command=command,
             working_directory=working_directory,
             hanging_sec=_HANGING_SEC,
-        )
+        ),
+        flush=True,
     )
 
 
-def execute_subprocess(commands, status_to_caller=False, output_to_caller=False):
-    """Wrapper around subprocess.check_output to handle common
+def execute_subprocess(commands, status_to_caller=False, output_to_caller=False, cwd=None):
+    """Wrapper around subprocess.Popen to handle common
     exceptions.
 
-    check_output runs a command with arguments and waits
-    for it to complete.
+    Runs a command with arguments and waits for it to complete,
+    warning the user if it seems to be hanging.
 
-    check_output raises an exception on a nonzero return code.  if
-    status_to_caller is true, execute_subprocess returns the subprocess
+    A nonzero return code raises CalledProcessError, as check_output
+    would.  if status_to_caller is true, execute_subprocess returns the subprocess
     return code, otherwise execute_subprocess treats non-zero return
     status as an error and raises an exception.
 
+    If cwd is given the command is run in that directory, the working
+    directory of the calling process is left unchanged.
+
+    The child is started without preexec_fn or a shell so subprocess can
+    use its vfork/posix_spawn fast path; cwd is only passed on when the
+    caller gave one.  The directory and the command line are only turned
+    into text when they are reported.
+
     """
-    cwd = os.getcwd()
-    msg = "In directory: {0}\nexecute_subprocess running command:".format(cwd)
-    logging.info(msg)
-    commands_str = " ".join(str(element) for element in commands)
-    logging.info(commands_str)
+    if logging.getLogger().isEnabledFor(logging.INFO):
+        workdir = cwd if cwd is not None else os.getcwd()
+        msg = "In directory: {0}\nexecute_subprocess running command:".format(workdir)
+        logging.info(msg)
+        logging.info(" ".join(str(element) for element in commands))
     return_to_caller = status_to_caller or output_to_caller
     status = -1
     output = ""
-    hanging_timer = Timer(
-        _HANGING_SEC,
-        _hanging_msg,
-        kwargs={"working_directory": cwd, "command": commands_str},
-    )
-    hanging_timer.start()
     try:
-        output = subprocess.check_output(
-            commands, stderr=subprocess.STDOUT, universal_newlines=True
-        )
+        with subprocess.Popen(
+            commands, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            universal_newlines=True, cwd=cwd
+        ) as proc:
+            # wait in communicate rather than in a timer thread per command,
+            # a command still running after _HANGING_SEC gets the warning
+            try:
+                output, _ = proc.communicate(timeout=_HANGING_SEC)
+            except subprocess.TimeoutExpired:
+                _hanging_msg(cwd, commands)
+                output, _ = proc.communicate()
+        if proc.returncode:
+            raise subprocess.CalledProcessError(proc.returncode, commands, output=output)
         log_process_output(output)
         status = 0
     except OSError as error:
         msg = failed_command_msg(
-            "Command execution failed. Does the executable exist?", commands
+            "Command execution failed. Does the executable exist?", commands, cwd=cwd
         )
         logging.error(error)
         fatal_error(msg)
     except ValueError as error:
         msg = failed_command_msg(
-            "DEV_ERROR: Invalid arguments trying to run subprocess", commands
+            "DEV_ERROR: Invalid arguments trying to run subprocess", commands, cwd=cwd
         )
         logging.error(error)
         fatal_error(msg)
@@ -306,20 +326,21 @@ def execute_subprocess(commands, status_to_caller=False, output_to_caller=False)
         # caller. If we are returning to the caller, then it may be a
         # simple status check. If returning, it is the callers
         # responsibility determine if an error occurred and handle it
-        # appropriately.
-        msg_context = (
-            "Process did not run successfully; "
-            "returned status {0}".format(error.returncode)
-        )
-        msg = failed_command_msg(msg_context, commands, output=error.output)
+        # appropriately.  Status checks fail routinely, so the message
+        # (command line, output tail) is only put together when reported.
+        # The failed command's output is not returned, as with check_output.
+        output = ""
         if not return_to_caller:
+            msg_context = (
+                "Process did not run successfully; "
+                "returned status {0}".format(error.returncode)
+            )
+            msg = failed_command_msg(msg_context, commands, output=error.output, cwd=cwd)
             logging.error(error)
             logging.error(msg)
             log_process_output(error.output)
             fatal_error(msg)
         status = error.returncode
-    finally:
-        hanging_timer.cancel()
 
     if status_to_caller and output_to_caller:
         ret_value = (status, output)
@@ -333,11 +354,12 @@ def execute_subprocess(commands, status_to_caller=False, output_to_caller=False)
     return ret_value
 
 
-def failed_command_msg(msg_context, command, output=None):
+def failed_command_msg(msg_context, command, output=None, cwd=None):
     """Template for consistent error messages from subprocess calls.
 
     If 'output' is given, it should provide the output from the failed
-    command
+    command. If 'cwd' is given it is reported as the directory the
+    command ran in, otherwise the current working directory is used.
     """
 
     if output:
@@ -350,13 +372,13 @@ def failed_command_msg(msg_context, command, output=None):
     else:
         errmsg = ""
 
-    command_str = " ".join(command)
+    command_str = " ".join(str(element) for element in command)
     errmsg += """In directory
     {cwd}
 {context}:
     {command}
 """.format(
-        cwd=os.getcwd(), context=msg_context, command=command_str
+        cwd=cwd or os.getcwd(), context=msg_context, command=command_str
     )
 
     if output:
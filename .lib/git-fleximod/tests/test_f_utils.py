@@ -0,0 +1,136 @@
+import sys
+import pytest
+from git_fleximod import utils
+
+# these tests run python rather than git and need no network
+
+FAILING = [sys.executable, "-c", "import sys; print('fatal: no such ref'); sys.exit(3)"]
+SUCCEEDING = [sys.executable, "-c", "print('line 1'); print('line 2')"]
+
+
+def test_execute_subprocess_output():
+    assert (
+        utils.execute_subprocess(SUCCEEDING, output_to_caller=True)
+        == "line 1\nline 2\n"
+    )
+    assert utils.execute_subprocess(
+        SUCCEEDING, status_to_caller=True, output_to_caller=True
+    ) == (0, "line 1\nline 2\n")
+
+
+def test_execute_subprocess_failure_returned():
+    # a failed command's output is not handed back as if it were the answer
+    assert utils.execute_subprocess(
+        FAILING, status_to_caller=True, output_to_caller=True
+    ) == (3, "")
+    assert utils.execute_subprocess(FAILING, status_to_caller=True) == 3
+    assert utils.execute_subprocess(FAILING, output_to_caller=True) == ""
+
+
+def test_execute_subprocess_failure_fatal():
+    with pytest.raises(RuntimeError, match="returned status 3"):
+        utils.execute_subprocess(FAILING)
+
+
+TRUNC = "[... Output truncated for brevity ...]"
+
+
+@pytest.mark.parametrize(
+    "text, n, expected",
+    [
+        ("a\nb\nc\n", 2, TRUNC + "\nb\nc\n"),
+        ("a\nb\nc", 2, TRUNC + "\nb\nc"),
+        # n at or above the line count returns the text untouched, without the message
+        ("a\nb\nc\n", 3, "a\nb\nc\n"),
+        ("a\nb\nc", 3, "a\nb\nc"),
+        ("a\nb\nc\n", 10, "a\nb\nc\n"),
+        ("", 2, ""),
+        ("\n", 1, "\n"),
+        # blank lines count as lines
+        ("a\n\n\nb\n", 2, TRUNC + "\n\nb\n"),
+        ("a\n\n\n", 2, TRUNC + "\n\n\n"),
+        # lines break as in str.splitlines, as indent_string breaks them
+        ("x\nfetch 10%\rfetch 100%\n", 1, TRUNC + "\nfetch 100%\n"),
+        ("x\nfetch 10%\rfetch 100%\n", 2, TRUNC + "\nfetch 10%\rfetch 100%\n"),
+        ("a\r\nb\r\nc\r\n", 2, TRUNC + "\nb\r\nc\r\n"),
+        ("a\rb\rc", 2, TRUNC + "\nb\rc"),
+    ],
+)
+def test_last_n_lines(text, n, expected):
+    assert utils.last_n_lines(text, n, truncation_message=TRUNC) == expected
+
+
+def test_last_n_lines_no_message():
+    assert utils.last_n_lines("a\nb\nc\n", 1) == "c\n"
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("a\nb", "  a\n  b"),
+        ("a\nb\n", "  a\n  b\n"),
+        # blank lines are indented too, nothing follows a final newline
+        ("a\n\nb\n", "  a\n  \n  b\n"),
+        ("\n", "  \n"),
+        ("", ""),
+        # lines break as in str.splitlines, so a progress line rewritten with \r stays indented
+        ("fetch 10%\rfetch 100%\n", "  fetch 10%\r  fetch 100%\n"),
+        ("a\r\nb\r\n", "  a\r\n  b\r\n"),
+    ],
+)
+def test_indent_string(text, expected):
+    assert utils.indent_string(text, 2) == expected
+
+
+@pytest.mark.parametrize(
+    "url, expected",
+    [
+        ("https://github.com/ESMCI/mpi-serial.git", "github.com/ESMCI/mpi-serial.git"),
+        ("git@github.com:ESMCI/mpi-serial.git", "ESMCI/mpi-serial.git"),
+        (
+            "ssh://git@github.com/ESMCI/mpi-serial.git",
+            "github.com/ESMCI/mpi-serial.git",
+        ),
+        (
+            "https://user@github.com/ESMCI/mpi-serial.git",
+            "github.com/ESMCI/mpi-serial.git",
+        ),
+        ("http://host:8080/repo", "8080/repo"),
+        # the remainder after the first "@" and ":" is kept whole
+        ("https://user@host:8080/a@b:c", "8080/a@b:c"),
+        ("git@github.com:org/repo", "org/repo"),
+        ("git@github.com:org/repo@v1:x", "x"),
+        # only the leading prefix is stripped
+        ("https://host/mirror/https://x", "//x"),
+        ("/local/path@x:y", "/local/path@x:y"),
+    ],
+)
+def test_split_remote_url(url, expected):
+    assert utils.split_remote_url(url) == expected
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("true", True),
+        ("True", True),
+        ("TRUE", True),
+        ("t", True),
+        ("T", True),
+        ("tRuE", True),
+        ("false", False),
+        ("False", False),
+        ("FALSE", False),
+        ("f", False),
+        ("F", False),
+        ("fAlSe", False),
+    ],
+)
+def test_str_to_bool(text, expected):
+    assert utils.str_to_bool(text) is expected
+
+
+@pytest.mark.parametrize("text", ["yes", "1", "", " true"])
+def test_str_to_bool_invalid(text):
+    with pytest.raises(RuntimeError):
+        utils.str_to_bool(text)
@@ -0,0 +1,131 @@
+import pytest
+from git_fleximod.submodule import Submodule
+
+# canned git output, these tests need neither git nor the network
+
+
+class CannedGit:
+    """Answers git_operation with fixed output, as GitInterface would"""
+
+    def __init__(self, output, repo_path, status=0):
+        self.output = output
+        self.repo_path = repo_path
+        self.status = status
+        self.calls = 0
+
+    def git_operation(self, operation, *args):
+        self.calls += 1
+        return self.status, self.output
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    Submodule._ls_remote_cache.clear()
+    Submodule._remotes_cache.clear()
+    yield
+    Submodule._ls_remote_cache.clear()
+    Submodule._remotes_cache.clear()
+
+
+LS_REMOTE = "\n".join(
+    [
+        "1111111111111111111111111111111111111111\trefs/tags/v1",
+        "2222222222222222222222222222222222222222\trefs/tags/v2",
+        "3333333333333333333333333333333333333333\trefs/tags/v2^{}",
+        "3333333333333333333333333333333333333333\trefs/tags/v2-alias",
+        "4444444444444444444444444444444444444444\trefs/heads/main",
+    ]
+)
+
+
+@pytest.mark.parametrize(
+    "key, by_tag",
+    [
+        ("v1", "1111111111111111111111111111111111111111"),
+        # an annotated tag maps to its tag object, not the peeled commit
+        ("v2", "2222222222222222222222222222222222222222"),
+        ("v2-alias", "3333333333333333333333333333333333333333"),
+        ("main", None),
+    ],
+)
+def test_ls_remote_by_tag(logger, key, by_tag):
+    submod = Submodule("/tmp", "sub", "sub", "https://example.com/a.git", logger=logger)
+    tags, _ = submod._ls_remote_tags(CannedGit(LS_REMOTE, "/tmp/sub"))
+    assert tags.get(key) == by_tag
+
+
+@pytest.mark.parametrize(
+    "key, by_hash",
+    [
+        ("1111111111111111111111111111111111111111", "v1"),
+        ("2222222222222222222222222222222222222222", "v2"),
+        # v2^{} is listed before v2-alias, so the commit maps back to the annotated tag
+        ("3333333333333333333333333333333333333333", "v2"),
+        ("4444444444444444444444444444444444444444", None),
+    ],
+)
+def test_ls_remote_by_hash(logger, key, by_hash):
+    submod = Submodule("/tmp", "sub", "sub", "https://example.com/a.git", logger=logger)
+    _, hashes = submod._ls_remote_tags(CannedGit(LS_REMOTE, "/tmp/sub"))
+    assert hashes.get(key) == by_hash
+
+
+def test_ls_remote_cached_per_url(logger):
+    git = CannedGit(LS_REMOTE, "/tmp/sub")
+    for path in ("a", "b"):
+        Submodule(
+            "/tmp", path, path, "https://example.com/a.git", logger=logger
+        )._ls_remote_tags(git)
+    assert git.calls == 1
+
+
+def test_ls_remote_failure_not_cached(logger):
+    submod = Submodule("/tmp", "sub", "sub", "https://example.com/a.git", logger=logger)
+    assert submod._ls_remote_tags(CannedGit("", "/tmp/sub", status=128)) == ({}, {})
+    tags, _ = submod._ls_remote_tags(CannedGit(LS_REMOTE, "/tmp/sub"))
+    assert tags["v1"] == "1111111111111111111111111111111111111111"
+
+
+REMOTE_V = "\n".join(
+    [
+        "origin\thttps://github.com/ESMCI/mpi-serial.git (fetch)",
+        "origin\thttps://github.com/ESMCI/mpi-serial.git (push)",
+        "fork\t/path/with spaces/repo (fetch)",
+        "fork\t/path/with spaces/repo (push)",
+        "partial\thttps://example.com/p.git (fetch) [blob:none]",
+        "partial\thttps://example.com/p.git (push)",
+        "again\thttps://github.com/ESMCI/mpi-serial.git (fetch)",
+    ]
+)
+
+
+@pytest.mark.parametrize(
+    "url, name",
+    [
+        ("https://github.com/ESMCI/mpi-serial.git", "origin"),
+        ("/path/with spaces/repo", "fork"),
+        ("https://example.com/p.git", "partial"),
+        ("https://example.com/p.git (fetch) [blob:none]", None),
+    ],
+)
+def test_remote_urls(url, name):
+    remotes = Submodule._remote_urls(CannedGit(REMOTE_V, "/tmp/sub"))
+    assert remotes.get(url) == name
+    assert len(remotes) == 3
+
+
+@pytest.mark.parametrize(
+    "line, fxtag, expected",
+    [
+        ('"abc1234  (HEAD, tag: v1, origin/main)"', "v1", ("abc1234", "v1")),
+        ('"abc1234  (HEAD, tag: v1, tag: v2)"', "v1", ("abc1234", "v1")),
+        ('"abc1234  (HEAD, tag: v1, tag: v2)"', "v3", ("abc1234", "v2")),
+        ('"abc1234  (HEAD -> main, origin/main)"', "v1", ("abc1234", None)),
+        ('"abc1234 "', None, ("abc1234", None)),
+        # only the enclosing quotes and parentheses are stripped
+        ('"abc1234  (HEAD, tag: v1))"', "v1)", ("abc1234", "v1)")),
+        ("abc1234  (tag: v1)", "v1", ("abc1234", "v1")),
+    ],
+)
+def test_parse_log_line(line, fxtag, expected):
+    assert Submodule._parse_log_line(line, fxtag) == expected
@@ -0,0 +1,94 @@
+import subprocess
+from types import SimpleNamespace
+
+import pytest
+from git_fleximod.gitinterface import GitInterface
+from git_fleximod.submodule import Submodule
+
+# these tests clone a local repository and need no network
+
+
+class ModuleGit:
+    """Runs git commands with the calling convention of GitPython's repo.git"""
+
+    def __init__(self, repo_path):
+        self.repo_path = repo_path
+
+    def __getattr__(self, operation):
+        def run(*args, with_exceptions=True, with_extended_output=False):
+            proc = subprocess.run(
+                ["git", operation, *args],
+                cwd=self.repo_path,
+                capture_output=True,
+                text=True,
+            )
+            if with_exceptions and proc.returncode:
+                raise RuntimeError(proc.stderr)
+            stdout = proc.stdout.rstrip("\n")
+            if with_extended_output:
+                return proc.returncode, stdout, proc.stderr
+            return stdout
+
+        return run
+
+
+@pytest.fixture
+def upstream(tmp_path):
+    repo = tmp_path / "upstream"
+    repo.mkdir()
+    for args in (
+        ["init", "-q"],
+        [
+            "-c",
+            "user.name=t",
+            "-c",
+            "user.email=t@t",
+            "commit",
+            "-q",
+            "--allow-empty",
+            "-m",
+            "one",
+        ],
+        ["tag", "v1"],
+    ):
+        subprocess.run(["git", *args], cwd=repo, check=True)
+    return repo
+
+
+@pytest.fixture(params=["shell", "module"])
+def rootgit(request, tmp_path, logger):
+    root = tmp_path / "root"
+    root.mkdir()
+    git = GitInterface(str(root), logger)
+    git._use_module = request.param == "module"
+    if git._use_module:
+        git.repo = SimpleNamespace(git=ModuleGit(root))
+    return git
+
+
+@pytest.mark.parametrize(
+    "fxtag, history",
+    [
+        ("v1", "true"),
+        # the tag is not there, the shallow clone fails and the full clone is made
+        ("nosuchtag", "false"),
+    ],
+)
+def test_clone_falls_back(logger, upstream, rootgit, fxtag, history):
+    submod = Submodule(
+        str(rootgit.repo_path),
+        "sub",
+        "sub",
+        f"file://{upstream}",
+        fxtag=fxtag,
+        logger=logger,
+    )
+    submod._clone(rootgit, [])
+    shallow = subprocess.run(
+        ["git", "rev-parse", "--is-shallow-repository"],
+        cwd=rootgit.repo_path / "sub",
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert shallow.stdout.strip() == history